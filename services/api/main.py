@@ -1,11 +1,17 @@
+import asyncio
 import base64
+import zlib
+from contextlib import aclosing
 
+import httpx
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from pydantic import BaseModel
 
 from clawdgle.config import load_config
+from clawdgle.dedupe import canonical_for
 from clawdgle.index import ensure_collection, find_by_url, make_typesense_client, search
+from clawdgle.profiling import collapsed, sample_stacks
 from clawdgle.queue import (
     enqueue,
     enqueue_suggestion,
@@ -14,22 +20,36 @@ from clawdgle.queue import (
     list_suggestions,
     make_redis,
 )
+from clawdgle.seed import aiter_lines, new_batch_key, parse_seed_line, seed_batch
+from clawdgle.sitemap import iter_sitemap_urls
 from clawdgle.storage import get_markdown, make_s3_client
+from clawdgle.tracing import init_tracing, span
+from clawdgle.urls import canonicalize_url
 
 app = FastAPI(title="clawdgle", version="0.1")
 
 cfg = load_config()
+init_tracing(cfg, "clawdgle-api")
 redis_client = make_redis(cfg)
 ts_client = make_typesense_client(cfg)
 ensure_collection(cfg, ts_client)
 s3_client = make_s3_client(cfg)
 
+SEED_BATCH_SIZE = 5000
+
 
 class SeedRequest(BaseModel):
     urls: list[str]
     depth: int = 1
 
 
+class SitemapSeedRequest(BaseModel):
+    url: str
+    depth: int = 1
+    max_urls: int = 1_000_000
+    max_sitemaps: int = 1000
+
+
 class SuggestRequest(BaseModel):
     url: str
     reason: str | None = None
@@ -145,6 +165,15 @@ async def suggestions(request: Request, limit: int = 50):
     return {"items": list_suggestions(redis_client, limit=limit)}
 
 
+@app.get("/admin/profile", response_class=PlainTextResponse)
+async def admin_profile(request: Request, seconds: int = 10):
+    if not _admin_ok(request):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    seconds = max(1, min(seconds, 120))
+    counts = await asyncio.to_thread(sample_stacks, seconds, cfg.profile_hz)
+    return collapsed(counts)
+
+
 @app.get("/admin-ui", response_class=HTMLResponse)
 async def admin_ui():
     return """<!doctype html>
@@ -231,19 +260,91 @@ async def admin_ui():
 
 @app.post("/seed")
 async def seed(req: SeedRequest):
-    for url in req.urls:
-        enqueue(redis_client, url, req.depth)
-    return {"queued": len(req.urls)}
+    items = [{"url": url, "depth": req.depth} for url in map(canonicalize_url, req.urls) if url]
+    queued = await asyncio.to_thread(seed_batch, redis_client, items, new_batch_key())
+    return {"queued": queued, "invalid": len(req.urls) - len(items)}
+
+
+@app.post("/seed/bulk")
+async def seed_bulk(request: Request, depth: int = 1):
+    # Body is NDJSON or one URL per line, optionally gzipped (sniffed, or
+    # declared with Content-Encoding: gzip).
+    if not _admin_ok(request):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    gzipped = True if "gzip" in request.headers.get("content-encoding", "").lower() else None
+    batch_key = new_batch_key()
+    received = invalid = queued = 0
+    batch: list[dict] = []
+    try:
+        async for line in aiter_lines(request.stream(), gzipped):
+            if not line:
+                continue
+            received += 1
+            item = parse_seed_line(line, depth)
+            if item is None:
+                invalid += 1
+                continue
+            batch.append(item)
+            if len(batch) >= SEED_BATCH_SIZE:
+                queued += await asyncio.to_thread(seed_batch, redis_client, batch, batch_key)
+                batch = []
+    except zlib.error:
+        redis_client.delete(batch_key)
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body after {queued} queued")
+    queued += await asyncio.to_thread(seed_batch, redis_client, batch, batch_key)
+    redis_client.delete(batch_key)
+    return {
+        "received": received,
+        "invalid": invalid,
+        "duplicate": received - invalid - queued,
+        "queued": queued,
+    }
+
+
+@app.post("/seed/sitemap")
+async def seed_sitemap(request: Request, req: SitemapSeedRequest):
+    if not _admin_ok(request):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    batch_key = new_batch_key()
+    stats = {"discovered": 0, "invalid": 0, "queued": 0}
+    batch: list[dict] = []
+    headers = {"User-Agent": cfg.api_user_agent}
+    async with httpx.AsyncClient(
+        timeout=cfg.crawl_timeout_secs, follow_redirects=True, headers=headers
+    ) as client:
+        urls = iter_sitemap_urls(client, req.url, stats, max_sitemaps=req.max_sitemaps)
+        async with aclosing(urls):
+            async for loc, lastmod in urls:
+                stats["discovered"] += 1
+                url = canonicalize_url(loc)
+                if not url:
+                    stats["invalid"] += 1
+                    continue
+                item = {"url": url, "depth": req.depth}
+                if lastmod:
+                    item["lastmod"] = lastmod
+                batch.append(item)
+                if len(batch) >= SEED_BATCH_SIZE:
+                    stats["queued"] += await asyncio.to_thread(seed_batch, redis_client, batch, batch_key)
+                    batch = []
+                if stats["discovered"] >= req.max_urls:
+                    break
+    stats["queued"] += await asyncio.to_thread(seed_batch, redis_client, batch, batch_key)
+    redis_client.delete(batch_key)
+    return stats
 
 
 @app.post("/ingest")
 async def ingest(req: SuggestRequest):
-    enqueue(redis_client, req.url, 0)
+    url = canonicalize_url(req.url)
+    if not url:
+        raise HTTPException(status_code=400, detail="Invalid URL")
+    enqueue(redis_client, url, 0)
     enqueue_suggestion(
         redis_client,
-        {"url": req.url, "reason": req.reason or "", "contact": req.contact or ""},
+        {"url": url, "reason": req.reason or "", "contact": req.contact or ""},
     )
-    return {"ok": True, "queued": req.url}
+    return {"ok": True, "queued": url}
 
 
 @app.get("/donate")
@@ -254,20 +355,34 @@ async def donate():
 
 
 @app.get("/search")
-async def search_endpoint(q: str, page: int = 1, per_page: int = 10):
-    results = search(cfg, ts_client, q, page=page, per_page=per_page)
+async def search_endpoint(q: str, page: int = 1, per_page: int = 10, host: str | None = None):
+    with span("api.search", q=q, page=page):
+        with span("api.search.typesense"):
+            results = search(cfg, ts_client, q, page=page, per_page=per_page, host=host)
     return results
 
 
 @app.get("/doc")
 async def doc(url: str):
-    doc = find_by_url(cfg, ts_client, url)
-    if not doc:
-        raise HTTPException(status_code=404, detail="Not found")
-    s3_key = doc.get("s3_key")
-    if not s3_key:
-        raise HTTPException(status_code=500, detail="Missing storage key")
-    markdown = get_markdown(cfg, s3_client, s3_key)
+    with span("api.doc", url=url):
+        with span("api.doc.typesense"):
+            # Pages are stored under their canonical URL; documents indexed
+            # before canonicalization are still found under the raw URL.
+            canonical_url = canonicalize_url(url) or url
+            doc = find_by_url(cfg, ts_client, canonical_url)
+            if not doc and canonical_url != url:
+                doc = find_by_url(cfg, ts_client, url)
+            if not doc:
+                duplicate_of = canonical_for(redis_client, canonical_url)
+                if duplicate_of:
+                    doc = find_by_url(cfg, ts_client, duplicate_of)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Not found")
+        s3_key = doc.get("s3_key")
+        if not s3_key:
+            raise HTTPException(status_code=500, detail="Missing storage key")
+        with span("api.doc.s3"):
+            markdown = get_markdown(cfg, s3_client, s3_key)
     return {
         "url": doc.get("url"),
         "title": doc.get("title"),
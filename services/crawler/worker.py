@@ -1,16 +1,20 @@
 import asyncio
-import hashlib
 import time
 from urllib.parse import urlparse
 
 import aiohttp
 
 from clawdgle.config import load_config
+from clawdgle.dedupe import add_fingerprint, check_near_duplicate, set_canonical
 from clawdgle.extract import discover_links, extract_markdown
-from clawdgle.index import ensure_collection, make_typesense_client, now_ts, upsert_document
-from clawdgle.queue import dequeue, enqueue, incr_stat, make_redis, mark_seen, set_heartbeat
+from clawdgle.index import ensure_collection, index_page, make_typesense_client, now_ts
+from clawdgle.profiling import install_profile_signal
+from clawdgle.queue import claim_stale, dequeue, enqueue, incr_stat, make_redis, mark_seen, set_heartbeat
 from clawdgle.robots import is_allowed, crawl_delay
+from clawdgle.seed import lastmod_ts
 from clawdgle.storage import make_s3_client, put_markdown
+from clawdgle.tracing import aiohttp_trace_config, init_tracing, span
+from clawdgle.urls import canonicalize_url
 
 
 async def fetch_html(session: aiohttp.ClientSession, url: str, timeout: int, max_bytes: int) -> str:
@@ -47,8 +51,96 @@ async def polite_wait(r, url: str, base_delay: int) -> None:
     r.set(key, time.time())
 
 
+def store_and_index(cfg, r, s3, ts, url: str, title: str, markdown: str) -> bool:
+    fetched_at = now_ts()
+    with span("crawl.store"):
+        s3_key = put_markdown(cfg, s3, url, markdown, title=title or "", fetched_at=fetched_at)
+    incr_stat(r, "stored")
+
+    page = {
+        "url": url,
+        "title": title or "",
+        "markdown": markdown,
+        "s3_key": s3_key,
+        "fetched_at": fetched_at,
+    }
+    with span("crawl.index"):
+        try:
+            index_page(cfg, ts, page)
+        except Exception:
+            incr_stat(r, "index_errors")
+            return False
+        incr_stat(r, "indexed")
+    return True
+
+
+async def process_item(cfg, r, s3, ts, session: aiohttp.ClientSession, item: dict) -> None:
+    url = canonicalize_url(item.get("url") or "")
+    depth = int(item.get("depth", 0))
+    if not url:
+        return
+
+    if depth > cfg.crawl_max_depth:
+        incr_stat(r, "skipped_max_depth")
+        return
+
+    if not should_crawl_domain(cfg, url):
+        incr_stat(r, "skipped_domain")
+        return
+
+    if not mark_seen(r, url):
+        if not claim_stale(r, url, lastmod_ts(item.get("lastmod"))):
+            incr_stat(r, "skipped_seen")
+            return
+        incr_stat(r, "refreshed")
+
+    with span("crawl.robots"):
+        if cfg.crawl_respect_robots and not is_allowed(url, cfg.api_user_agent):
+            incr_stat(r, "skipped_robots")
+            return
+
+        robots_delay = crawl_delay(url, cfg.api_user_agent) if cfg.crawl_respect_robots else 0
+
+    with span("crawl.polite_wait"):
+        await polite_wait(r, url, max(cfg.crawl_polite_delay_secs, robots_delay))
+
+    with span("crawl.fetch"):
+        try:
+            html = await fetch_html(session, url, cfg.crawl_timeout_secs, cfg.crawl_max_bytes)
+        except Exception:
+            incr_stat(r, "fetch_errors")
+            return
+
+    with span("crawl.extract"):
+        try:
+            title, markdown = extract_markdown(html)
+        except Exception:
+            incr_stat(r, "extract_errors")
+            return
+
+    fp, duplicate_of = None, None
+    if cfg.dedupe_mode != "off":
+        with span("crawl.dedupe"):
+            fp, duplicate_of = check_near_duplicate(r, url, markdown, cfg.dedupe_max_distance)
+
+    if duplicate_of:
+        incr_stat(r, "near_duplicates")
+        if cfg.dedupe_mode == "canonical":
+            set_canonical(r, url, duplicate_of)
+    elif store_and_index(cfg, r, s3, ts, url, title, markdown) and fp is not None:
+        add_fingerprint(r, url, fp, cfg.dedupe_max_distance)
+
+    if depth < cfg.crawl_max_depth:
+        with span("crawl.links"):
+            for link in discover_links(url, html):
+                enqueue(r, link, depth + 1)
+        incr_stat(r, "links_enqueued")
+
+
 async def worker_loop():
     cfg = load_config()
+    init_tracing(cfg, "clawdgle-crawler")
+    install_profile_signal(cfg, "crawler")
     r = make_redis(cfg)
     s3 = make_s3_client(cfg)
     ts = make_typesense_client(cfg)
@@ -57,7 +149,9 @@ async def worker_loop():
     timeout = aiohttp.ClientTimeout(total=cfg.crawl_timeout_secs)
     headers = {"User-Agent": cfg.api_user_agent}
 
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+    async with aiohttp.ClientSession(
+        timeout=timeout, headers=headers, trace_configs=[aiohttp_trace_config()]
+    ) as session:
         while True:
             set_heartbeat(r, now_ts())
             item = dequeue(r)
@@ -65,65 +159,8 @@ async def worker_loop():
                 await asyncio.sleep(0.5)
                 continue
 
-            url = item.get("url")
-            depth = int(item.get("depth", 0))
-            if not url:
-                continue
-
-            if depth > cfg.crawl_max_depth:
-                incr_stat(r, "skipped_max_depth")
-                continue
-
-            if not should_crawl_domain(cfg, url):
-                incr_stat(r, "skipped_domain")
-                continue
-
-            if not mark_seen(r, url):
-                incr_stat(r, "skipped_seen")
-                continue
-
-            if cfg.crawl_respect_robots and not is_allowed(url, cfg.api_user_agent):
-                incr_stat(r, "skipped_robots")
-                continue
-
-            robots_delay = crawl_delay(url, cfg.api_user_agent) if cfg.crawl_respect_robots else 0
-            await polite_wait(r, url, max(cfg.crawl_polite_delay_secs, robots_delay))
-
-            try:
-                html = await fetch_html(session, url, cfg.crawl_timeout_secs, cfg.crawl_max_bytes)
-            except Exception:
-                incr_stat(r, "fetch_errors")
-                continue
-
-            try:
-                title, markdown = extract_markdown(html)
-            except Exception:
-                incr_stat(r, "extract_errors")
-                continue
-
-            s3_key = put_markdown(cfg, s3, url, markdown)
-            incr_stat(r, "stored")
-
-            doc = {
-                "id": hashlib.sha256(url.encode("utf-8")).hexdigest(),
-                "url": url,
-                "title": title or "",
-                "content": markdown[:200000],
-                "s3_key": s3_key,
-                "fetched_at": now_ts(),
-            }
-            try:
-                upsert_document(cfg, ts, doc)
-            except Exception:
-                incr_stat(r, "index_errors")
-                pass
-            else:
-                incr_stat(r, "indexed")
-
-            if depth < cfg.crawl_max_depth:
-                for link in discover_links(url, html):
-                    enqueue(r, link, depth + 1)
-                incr_stat(r, "links_enqueued")
+            with span("crawl.page", url=item.get("url"), depth=item.get("depth")):
+                await process_item(cfg, r, s3, ts, session, item)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,14 @@ __all__ = [
     "config",
     "storage",
     "index",
+    "dedupe",
     "extract",
     "robots",
     "queue",
+    "seed",
+    "sitemap",
+    "urls",
+    "reindex",
+    "tracing",
+    "profiling",
 ]
@@ -19,6 +19,10 @@ def _get_int(name: str, default: int) -> int:
         return default
 
 
+DEDUPE_MODES = {"off", "skip", "canonical"}
+MAX_DEDUPE_DISTANCE = 15
+
+
 @dataclass
 class Config:
     api_user_agent: str
@@ -30,6 +34,8 @@ class Config:
     crawl_allow_domains: list[str]
     crawl_respect_robots: bool
     crawl_polite_delay_secs: int
+    dedupe_mode: str
+    dedupe_max_distance: int
 
     redis_url: str
 
@@ -38,6 +44,12 @@ class Config:
     typesense_protocol: str
     typesense_api_key: str
     typesense_collection: str
+    typesense_index_mode: str
+    typesense_query_by: str
+    typesense_query_by_weights: str
+    typesense_summary_chars: int
+    typesense_chunk_chars: int
+    typesense_max_chunks: int
 
     s3_endpoint_url: str
     s3_region: str
@@ -51,11 +63,29 @@ class Config:
     admin_basic_pass: str
     donate_url: str
 
+    trace_enabled: bool
+    trace_exporter: str
+    trace_otlp_endpoint: str
+    trace_file_path: str
+
+    profile_dir: str
+    profile_hz: int
+    profile_seconds: int
+
 
 def load_config() -> Config:
     allow_domains = os.getenv("CRAWL_ALLOW_DOMAINS", "").strip()
     allow_domains_list = [d.strip() for d in allow_domains.split(",") if d.strip()]
 
+    dedupe_mode = os.getenv("DEDUPE_MODE", "off").strip().lower()
+    if dedupe_mode not in DEDUPE_MODES:
+        raise ValueError(f"DEDUPE_MODE must be one of {sorted(DEDUPE_MODES)}, got {dedupe_mode!r}")
+    dedupe_max_distance = _get_int("DEDUPE_MAX_DISTANCE", 3)
+    if not 0 <= dedupe_max_distance <= MAX_DEDUPE_DISTANCE:
+        raise ValueError(
+            f"DEDUPE_MAX_DISTANCE must be between 0 and {MAX_DEDUPE_DISTANCE}, got {dedupe_max_distance}"
+        )
+
     return Config(
         api_user_agent=os.getenv("API_USER_AGENT", "ClawdgleBot/0.1"),
 
@@ -66,6 +96,8 @@ def load_config() -> Config:
         crawl_allow_domains=allow_domains_list,
         crawl_respect_robots=_get_bool("CRAWL_RESPECT_ROBOTS", True),
         crawl_polite_delay_secs=_get_int("CRAWL_POLITE_DELAY_SECS", 1),
+        dedupe_mode=dedupe_mode,
+        dedupe_max_distance=dedupe_max_distance,
 
         redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
 
@@ -74,6 +106,12 @@ def load_config() -> Config:
         typesense_protocol=os.getenv("TYPESENSE_PROTOCOL", "http"),
         typesense_api_key=os.getenv("TYPESENSE_API_KEY", "typesense123"),
         typesense_collection=os.getenv("TYPESENSE_COLLECTION", "clawdgle_docs"),
+        typesense_index_mode=os.getenv("TYPESENSE_INDEX_MODE", "full").strip().lower(),
+        typesense_query_by=os.getenv("TYPESENSE_QUERY_BY", "").strip(),
+        typesense_query_by_weights=os.getenv("TYPESENSE_QUERY_BY_WEIGHTS", "").strip(),
+        typesense_summary_chars=_get_int("TYPESENSE_SUMMARY_CHARS", 2000),
+        typesense_chunk_chars=_get_int("TYPESENSE_CHUNK_CHARS", 1500),
+        typesense_max_chunks=_get_int("TYPESENSE_MAX_CHUNKS", 50),
 
         s3_endpoint_url=os.getenv("S3_ENDPOINT_URL", "http://localhost:9000"),
         s3_region=os.getenv("S3_REGION", "us-east-1"),
@@ -86,4 +124,13 @@ def load_config() -> Config:
         admin_basic_user=os.getenv("ADMIN_BASIC_USER", ""),
         admin_basic_pass=os.getenv("ADMIN_BASIC_PASS", ""),
         donate_url=os.getenv("DONATE_URL", ""),
+
+        trace_enabled=_get_bool("TRACE_ENABLED", False),
+        trace_exporter=os.getenv("TRACE_EXPORTER", "otlp").strip().lower(),
+        trace_otlp_endpoint=os.getenv("TRACE_OTLP_ENDPOINT", ""),
+        trace_file_path=os.getenv("TRACE_FILE_PATH", "/tmp/clawdgle-traces.jsonl"),
+
+        profile_dir=os.getenv("PROFILE_DIR", "/tmp/clawdgle-profiles"),
+        profile_hz=_get_int("PROFILE_HZ", 100),
+        profile_seconds=_get_int("PROFILE_SECONDS", 30),
     )
@@ -0,0 +1,141 @@
+import argparse
+import hashlib
+import re
+from typing import Optional, Tuple
+
+import redis
+
+from clawdgle.config import load_config
+from clawdgle.queue import make_redis
+
+_TOKEN_RE = re.compile(r"\w+")
+_SHINGLE = 3
+_MIN_TOKENS = 20
+_MAX_SHINGLES = 20000
+
+
+def simhash(text: str) -> Optional[int]:
+    # 64-bit SimHash over word 3-shingles. Very short pages are skipped:
+    # their fingerprints collide too easily to be meaningful.
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < _MIN_TOKENS:
+        return None
+    counts: dict[int, int] = {}
+    for i in range(min(len(tokens) - _SHINGLE + 1, _MAX_SHINGLES)):
+        shingle = " ".join(tokens[i:i + _SHINGLE]).encode("utf-8")
+        h = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "big")
+        counts[h] = counts.get(h, 0) + 1
+    total = sum(counts.values())
+    fp = 0
+    for bit in range(64):
+        ones = sum(n for h, n in counts.items() if (h >> bit) & 1)
+        if ones * 2 > total:
+            fp |= 1 << bit
+    return fp
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def band_keys(fp: int, max_distance: int) -> list[str]:
+    # Splitting 64 bits into max_distance + 1 bands guarantees that two
+    # fingerprints within max_distance bits agree on at least one band.
+    n = max_distance + 1
+    width, extra = divmod(64, n)
+    keys = []
+    pos = 0
+    for i in range(n):
+        w = width + (1 if i < extra else 0)
+        keys.append(f"dedupe:band:{n}:{i}:{(fp >> pos) & ((1 << w) - 1):x}")
+        pos += w
+    return keys
+
+
+def find_near_duplicate(r: redis.Redis, url: str, fp: int, max_distance: int) -> Optional[str]:
+    # Buckets only hold canonical pages and each band is 16 bits wide at the
+    # default distance, so they stay small enough to read whole.
+    pipe = r.pipeline(transaction=False)
+    for key in band_keys(fp, max_distance):
+        pipe.smembers(key)
+    candidates = set()
+    for members in pipe.execute():
+        candidates.update(members or [])
+    candidates.discard(url)
+    if not candidates:
+        return None
+
+    candidates = list(candidates)
+    best, best_dist = None, max_distance + 1
+    for cand, cand_fp in zip(candidates, r.hmget("dedupe:fp", candidates)):
+        if not cand_fp:
+            continue
+        dist = hamming(fp, int(cand_fp, 16))
+        if dist < best_dist:
+            best, best_dist = cand, dist
+    return best
+
+
+def add_fingerprint(r: redis.Redis, url: str, fp: int, max_distance: int) -> None:
+    pipe = r.pipeline(transaction=False)
+    for key in band_keys(fp, max_distance):
+        pipe.sadd(key, url)
+    pipe.hset("dedupe:fp", url, f"{fp:x}")
+    pipe.execute()
+
+
+def check_near_duplicate(
+    r: redis.Redis, url: str, markdown: str, max_distance: int
+) -> Tuple[Optional[int], Optional[str]]:
+    # Lookup only: the caller adds the fingerprint with add_fingerprint once
+    # the page is actually stored, so duplicates never point at a missing doc.
+    fp = simhash(markdown)
+    if fp is None:
+        return None, None
+    return fp, find_near_duplicate(r, url, fp, max_distance)
+
+
+def set_canonical(r: redis.Redis, url: str, canonical_url: str) -> None:
+    r.hset("dedupe:canonical", url, canonical_url)
+
+
+def canonical_for(r: redis.Redis, url: str) -> Optional[str]:
+    return r.hget("dedupe:canonical", url)
+
+
+def rebuild_bands(r: redis.Redis, max_distance: int, batch: int = 1000) -> int:
+    # Band keys embed the band count, so changing DEDUPE_MAX_DISTANCE leaves
+    # the old buckets unused. This refills the new layout from dedupe:fp and
+    # deletes buckets of any other layout.
+    n = max_distance + 1
+    count = 0
+    pipe = r.pipeline(transaction=False)
+    for url, fp in r.hscan_iter("dedupe:fp", count=batch):
+        for key in band_keys(int(fp, 16), max_distance):
+            pipe.sadd(key, url)
+        count += 1
+        if count % batch == 0:
+            pipe.execute()
+    pipe.execute()
+
+    prefix = f"dedupe:band:{n}:"
+    stale = [k for k in r.scan_iter("dedupe:band:*", count=batch) if not k.startswith(prefix)]
+    for start in range(0, len(stale), batch):
+        r.delete(*stale[start:start + batch])
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m clawdgle.dedupe")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild-bands", help="rebuild LSH buckets for the current DEDUPE_MAX_DISTANCE")
+    args = parser.parse_args()
+
+    cfg = load_config()
+    if args.cmd == "rebuild-bands":
+        count = rebuild_bands(make_redis(cfg), cfg.dedupe_max_distance)
+        print(f"rebuilt buckets for {count} fingerprints")
+
+
+if __name__ == "__main__":
+    main()
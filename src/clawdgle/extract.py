@@ -1,19 +1,46 @@
 from typing import Iterable, Tuple
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 from readability import Document
 from markdownify import markdownify as md
 
+from clawdgle.tracing import span
+from clawdgle.urls import canonicalize_url
+
 
 def extract_markdown(html: str) -> Tuple[str, str]:
-    doc = Document(html)
-    title = doc.short_title()
-    cleaned_html = doc.summary(html_partial=True)
-    markdown = md(cleaned_html, heading_style="ATX")
+    with span("extract.readability"):
+        doc = Document(html)
+        title = doc.short_title()
+        cleaned_html = doc.summary(html_partial=True)
+    with span("extract.markdownify"):
+        markdown = md(cleaned_html, heading_style="ATX")
     return title, markdown
 
 
+def chunk_markdown(markdown: str, size: int, max_chunks: int) -> list[str]:
+    # Packs paragraphs into passages of at most `size` chars; paragraphs
+    # longer than that are hard-split.
+    chunks: list[str] = []
+    buf: list[str] = []
+    buf_len = 0
+    for block in markdown.split("\n\n"):
+        block = block.strip()
+        for start in range(0, len(block), size):
+            piece = block[start:start + size]
+            if buf and buf_len + len(piece) > size:
+                chunks.append("\n\n".join(buf))
+                if len(chunks) >= max_chunks:
+                    return chunks
+                buf, buf_len = [], 0
+            buf.append(piece)
+            buf_len += len(piece) + 2
+    if buf:
+        chunks.append("\n\n".join(buf))
+    return chunks
+
+
 def discover_links(base_url: str, html: str) -> Iterable[str]:
     soup = BeautifulSoup(html, "lxml")
     for a in soup.find_all("a"):
@@ -25,8 +52,7 @@ def discover_links(base_url: str, html: str) -> Iterable[str]:
             continue
         if href.startswith("mailto:") or href.startswith("javascript:"):
             continue
-        url = urljoin(base_url, href)
-        parsed = urlparse(url)
-        if parsed.scheme not in {"http", "https"}:
+        url = canonicalize_url(urljoin(base_url, href))
+        if not url:
             continue
         yield url
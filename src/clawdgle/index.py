@@ -1,12 +1,19 @@
+import argparse
+import hashlib
+import json
 import time
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
 
+import httpx
 import typesense
+from typesense.exceptions import ObjectAlreadyExists, ObjectNotFound
 
-from clawdgle.config import Config
+from clawdgle.config import Config, load_config
+from clawdgle.extract import chunk_markdown
 
 
-def make_typesense_client(cfg: Config):
+def make_typesense_client(cfg: Config, connection_timeout: int = 5):
     return typesense.Client(
         {
             "nodes": [
@@ -17,62 +24,460 @@ def make_typesense_client(cfg: Config):
                 }
             ],
             "api_key": cfg.typesense_api_key,
-            "connection_timeout_seconds": 5,
+            "connection_timeout_seconds": connection_timeout,
         }
     )
 
 
-def ensure_collection(cfg: Config, client) -> None:
-    try:
-        client.collections[cfg.typesense_collection].retrieve()
-        return
-    except Exception:
-        pass
+def is_chunked(cfg: Config) -> bool:
+    return cfg.typesense_index_mode == "chunked"
+
+
+_INITIAL_VERSION = "v1"
 
-    schema = {
-        "name": cfg.typesense_collection,
+# Collection schemas never change under a name, so the mode of each
+# physical collection is cached for the life of the process.
+_collection_modes: dict[str, bool] = {}
+
+
+def chunks_alias(cfg: Config) -> str:
+    return f"{cfg.typesense_collection}_chunks"
+
+
+def doc_id_for_url(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def doc_schema(cfg: Config, name: str) -> dict:
+    # `url` is only ever looked up by id (sha256 of the url), so it is stored
+    # but not indexed; in chunked mode `content` is a display summary and the
+    # searchable text lives in the chunks collection.
+    return {
+        "name": name,
         "fields": [
             {"name": "id", "type": "string"},
-            {"name": "url", "type": "string"},
+            {"name": "url", "type": "string", "index": False, "optional": True},
+            {"name": "host", "type": "string", "facet": True, "optional": True},
             {"name": "title", "type": "string", "optional": True},
-            {"name": "content", "type": "string", "optional": True},
-            {"name": "s3_key", "type": "string"},
+            {"name": "content", "type": "string", "optional": True, "index": not is_chunked(cfg)},
+            {"name": "s3_key", "type": "string", "index": False, "optional": True},
             {"name": "fetched_at", "type": "int64"},
         ],
         "default_sorting_field": "fetched_at",
     }
-    client.collections.create(schema)
+
+
+def chunk_schema(cfg: Config, name: str) -> dict:
+    return {
+        "name": name,
+        "fields": [
+            {"name": "id", "type": "string"},
+            {"name": "doc_id", "type": "string", "facet": True},
+            {"name": "position", "type": "int32"},
+            {"name": "url", "type": "string", "index": False, "optional": True},
+            {"name": "host", "type": "string", "facet": True, "optional": True},
+            {"name": "title", "type": "string", "optional": True},
+            {"name": "text", "type": "string"},
+            {"name": "s3_key", "type": "string", "index": False, "optional": True},
+            {"name": "fetched_at", "type": "int64"},
+        ],
+        "default_sorting_field": "fetched_at",
+    }
+
+
+def resolve_alias(client, alias: str) -> Optional[str]:
+    try:
+        return client.aliases[alias].retrieve()["collection_name"]
+    except Exception:
+        return None
+
+
+def _ensure_alias(client, alias: str, schema: dict) -> None:
+    if resolve_alias(client, alias):
+        return
+    try:
+        # Pre-alias deployments created the collection under the alias name.
+        client.collections[alias].retrieve()
+        return
+    except Exception:
+        pass
+    # Every service starting on a fresh stack creates the same fixed name, so
+    # concurrent starts converge on one collection instead of racing.
+    try:
+        client.collections.create(schema)
+    except ObjectAlreadyExists:
+        pass
+    client.aliases.upsert(alias, {"collection_name": schema["name"]})
+
+
+def ensure_collection(cfg: Config, client) -> None:
+    # On an existing index the live schema decides the mode (see
+    # live_is_chunked); TYPESENSE_INDEX_MODE only shapes new collections.
+    fresh = resolve_alias(client, cfg.typesense_collection) is None and not _is_legacy_collection(
+        client, cfg.typesense_collection
+    )
+    _ensure_alias(
+        client,
+        cfg.typesense_collection,
+        doc_schema(cfg, f"{cfg.typesense_collection}_{_INITIAL_VERSION}"),
+    )
+    chunked = is_chunked(cfg) if fresh else live_is_chunked(cfg, client)
+    if chunked:
+        _ensure_alias(
+            client,
+            chunks_alias(cfg),
+            chunk_schema(cfg, f"{chunks_alias(cfg)}_{_INITIAL_VERSION}"),
+        )
+
+
+def collection_is_chunked(client, name: str) -> bool:
+    if name not in _collection_modes:
+        fields = client.collections[name].retrieve().get("fields", [])
+        _collection_modes[name] = any(
+            f.get("name") == "content" and f.get("index") is False for f in fields
+        )
+    return _collection_modes[name]
+
+
+def live_is_chunked(cfg: Config, client) -> bool:
+    # Follows whatever the alias points at right now, so a migration that
+    # switches modes takes effect in running services at the swap.
+    target = resolve_alias(client, cfg.typesense_collection) or cfg.typesense_collection
+    try:
+        return collection_is_chunked(client, target)
+    except Exception:
+        return is_chunked(cfg)
+
+
+def create_collections(cfg: Config, client, version: Optional[str] = None) -> str:
+    version = version or str(now_ts())
+    client.collections.create(doc_schema(cfg, f"{cfg.typesense_collection}_{version}"))
+    if is_chunked(cfg):
+        client.collections.create(chunk_schema(cfg, f"{chunks_alias(cfg)}_{version}"))
+    return version
+
+
+def version_targets(cfg: Config, version: str) -> list[Tuple[str, str]]:
+    targets = [(cfg.typesense_collection, f"{cfg.typesense_collection}_{version}")]
+    if is_chunked(cfg):
+        targets.append((chunks_alias(cfg), f"{chunks_alias(cfg)}_{version}"))
+    return targets
+
+
+def _is_legacy_collection(client, alias: str) -> bool:
+    if resolve_alias(client, alias):
+        return False
+    try:
+        client.collections[alias].retrieve()
+        return True
+    except Exception:
+        return False
+
+
+def check_swap(cfg: Config, client, drop_old: bool) -> None:
+    # Typesense resolves a real collection before an alias of the same name,
+    # so a pre-alias collection has to be deleted for the swap to take effect.
+    if drop_old:
+        return
+    for alias, _ in version_targets(cfg, "0"):
+        if _is_legacy_collection(client, alias):
+            raise RuntimeError(
+                f"'{alias}' is a collection, not an alias; rerun with --drop-old to replace it"
+            )
+
+
+def swap_alias(cfg: Config, client, version: str, drop_old: bool = False) -> list[str]:
+    # Returns the collections the aliases pointed at before, for the caller
+    # to drop once it no longer needs them.
+    check_swap(cfg, client, drop_old)
+    previous = []
+    for alias, target in version_targets(cfg, version):
+        if _is_legacy_collection(client, alias):
+            client.collections[alias].delete()
+        old = resolve_alias(client, alias)
+        client.aliases.upsert(alias, {"collection_name": target})
+        if old and old != target:
+            previous.append(old)
+    return previous
+
+
+def drop_collections(client, names: Iterable[str]) -> None:
+    for name in names:
+        client.collections[name].delete()
+
+
+def build_documents(
+    cfg: Config, page: dict, chunked: Optional[bool] = None
+) -> Tuple[dict, list[dict]]:
+    url = page["url"]
+    doc_id = doc_id_for_url(url)
+    markdown = page.get("markdown") or ""
+    base = {
+        "url": url,
+        "host": urlparse(url).netloc,
+        "title": page.get("title") or "",
+        "s3_key": page["s3_key"],
+        "fetched_at": int(page["fetched_at"]),
+    }
+    if chunked is None:
+        chunked = is_chunked(cfg)
+    if not chunked:
+        return {"id": doc_id, **base, "content": markdown[:200000]}, []
+
+    doc = {"id": doc_id, **base, "content": markdown[: cfg.typesense_summary_chars]}
+    chunks = [
+        {"id": f"{doc_id}-{i}", "doc_id": doc_id, "position": i, **base, "text": text}
+        for i, text in enumerate(
+            chunk_markdown(markdown, cfg.typesense_chunk_chars, cfg.typesense_max_chunks)
+        )
+    ]
+    return doc, chunks
+
+
+def _check_import(results: list) -> None:
+    failed = [r for r in results if not r.get("success")]
+    if failed:
+        raise RuntimeError(f"typesense import failed for {len(failed)} docs: {failed[0].get('error')}")
+
+
+def import_documents(client, collection: str, docs: Iterable[dict]) -> int:
+    docs = list(docs)
+    if not docs:
+        return 0
+    jsonl = "\n".join(json.dumps(d) for d in docs)
+    results = client.collections[collection].documents.import_(jsonl, {"action": "upsert"})
+    if isinstance(results, str):
+        results = [json.loads(line) for line in results.splitlines() if line]
+    _check_import(results)
+    return len(docs)
 
 
 def upsert_document(cfg: Config, client, doc: dict) -> None:
     client.collections[cfg.typesense_collection].documents.upsert(doc)
 
 
-def search(cfg: Config, client, q: str, page: int = 1, per_page: int = 10) -> dict:
-    return client.collections[cfg.typesense_collection].documents.search(
-        {
-            "q": q,
-            "query_by": "title,content,url",
-            "page": page,
-            "per_page": per_page,
-        }
+def index_page(cfg: Config, client, page: dict) -> None:
+    chunked = live_is_chunked(cfg, client)
+    doc, chunks = build_documents(cfg, page, chunked=chunked)
+    upsert_document(cfg, client, doc)
+    if not chunked:
+        return
+    import_documents(client, chunks_alias(cfg), chunks)
+    # Drop chunks left over from a longer previous version of the page.
+    client.collections[chunks_alias(cfg)].documents.delete(
+        {"filter_by": f"doc_id:={doc['id']} && position:>={len(chunks)}"}
     )
 
 
-def find_by_url(cfg: Config, client, url: str) -> Optional[dict]:
-    results = client.collections[cfg.typesense_collection].documents.search(
-        {
-            "q": url,
-            "query_by": "url",
-            "filter_by": f"url:={url}",
-            "per_page": 1,
+def _query_by(cfg: Config, chunked: bool) -> Tuple[str, str]:
+    # TYPESENSE_QUERY_BY is written for the configured mode; while the live
+    # collection is still in the other mode the defaults are used instead.
+    if cfg.typesense_query_by and chunked == is_chunked(cfg):
+        return cfg.typesense_query_by, cfg.typesense_query_by_weights
+    if chunked:
+        return "title,text", "3,1"
+    return "title,content", "3,1"
+
+
+def search(
+    cfg: Config, client, q: str, page: int = 1, per_page: int = 10, host: Optional[str] = None
+) -> dict:
+    chunked = live_is_chunked(cfg, client)
+    query_by, weights = _query_by(cfg, chunked)
+    params = {
+        "q": q,
+        "query_by": query_by,
+        "page": page,
+        "per_page": per_page,
+    }
+    if weights:
+        params["query_by_weights"] = weights
+    if host:
+        params["filter_by"] = f"host:=`{host}`"
+    if not chunked:
+        return client.collections[cfg.typesense_collection].documents.search(params)
+
+    params["group_by"] = "doc_id"
+    params["group_limit"] = 1
+    params["exclude_fields"] = "text"
+    params["highlight_fields"] = "text"
+    results = client.collections[chunks_alias(cfg)].documents.search(params)
+    return _ungroup_chunk_results(results)
+
+
+def _ungroup_chunk_results(results: dict) -> dict:
+    # Presents one hit per page with page-level document fields, so /search
+    # keeps the same response shape in both index modes.
+    hits = []
+    for group in results.pop("grouped_hits", []):
+        if not group.get("hits"):
+            continue
+        hit = group["hits"][0]
+        chunk = hit.get("document", {})
+        doc = {
+            "id": chunk.get("doc_id"),
+            "url": chunk.get("url"),
+            "host": chunk.get("host"),
+            "title": chunk.get("title"),
+            "s3_key": chunk.get("s3_key"),
+            "fetched_at": chunk.get("fetched_at"),
         }
-    )
-    hits = results.get("hits", [])
-    if not hits:
+        hits.append({**hit, "document": doc})
+    results["hits"] = hits
+    return results
+
+
+def get_document(cfg: Config, client, doc_id: str) -> Optional[dict]:
+    try:
+        return client.collections[cfg.typesense_collection].documents[doc_id].retrieve()
+    except ObjectNotFound:
         return None
-    return hits[0]["document"]
+
+
+def find_by_url(cfg: Config, client, url: str) -> Optional[dict]:
+    return get_document(cfg, client, doc_id_for_url(url))
+
+
+def iter_export(cfg: Config, collection: str, filter_by: Optional[str] = None) -> Iterator[dict]:
+    # Streams the export endpoint line by line; the client library's export()
+    # would buffer the whole collection in one string.
+    url = (
+        f"{cfg.typesense_protocol}://{cfg.typesense_host}:{cfg.typesense_port}"
+        f"/collections/{collection}/documents/export"
+    )
+    params = {"filter_by": filter_by} if filter_by else {}
+    headers = {"X-TYPESENSE-API-KEY": cfg.typesense_api_key}
+    with httpx.stream("GET", url, params=params, headers=headers, timeout=60) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def _page_from_doc(old: dict) -> dict:
+    return {
+        "url": old["url"],
+        "title": old.get("title"),
+        "markdown": old.get("content"),
+        "s3_key": old["s3_key"],
+        "fetched_at": old["fetched_at"],
+    }
+
+
+def copy_documents(
+    cfg: Config,
+    client,
+    version: str,
+    pages: Iterable[dict],
+    batch_size: int = 1000,
+    skip_newer: bool = False,
+) -> int:
+    # Indexes pages under the current schema into `version`. With skip_newer,
+    # pages the target already has at the same or a later fetched_at are left
+    # alone (used once the crawler writes to the target).
+    targets = dict(version_targets(cfg, version))
+    doc_target = targets[cfg.typesense_collection]
+    chunk_target = targets.get(chunks_alias(cfg))
+
+    copied = 0
+    batch: list[dict] = []
+    chunks: list[dict] = []
+    for page in pages:
+        if skip_newer:
+            try:
+                current = client.collections[doc_target].documents[doc_id_for_url(page["url"])].retrieve()
+            except ObjectNotFound:
+                current = None
+            if current and current.get("fetched_at", 0) >= int(page["fetched_at"]):
+                continue
+        doc, doc_chunks = build_documents(cfg, page)
+        batch.append(doc)
+        chunks.extend(doc_chunks)
+        if len(batch) >= batch_size:
+            copied += import_documents(client, doc_target, batch)
+            batch = []
+        if chunk_target and len(chunks) >= batch_size:
+            import_documents(client, chunk_target, chunks)
+            chunks = []
+    copied += import_documents(client, doc_target, batch)
+    if chunk_target:
+        import_documents(client, chunk_target, chunks)
+    return copied
+
+
+def catch_up_and_swap(
+    cfg: Config,
+    client,
+    version: str,
+    since: int,
+    copy_since,
+    drop_old: bool = False,
+    max_passes: int = 5,
+) -> None:
+    # The crawler keeps writing to the old collection while a rebuild runs.
+    # copy_since(since) copies docs fetched at or after `since` from the old
+    # collection into `version`; passes repeat until one finds nothing, then
+    # the alias is swapped and a last pass picks up writes that raced it.
+    source = resolve_alias(client, cfg.typesense_collection)
+    check_swap(cfg, client, drop_old)
+    for _ in range(max_passes):
+        pass_start = now_ts()
+        if copy_since(since, False) == 0:
+            break
+        since = pass_start
+    previous = swap_alias(cfg, client, version, drop_old=drop_old)
+    if source:
+        copy_since(since, True)
+    if drop_old:
+        drop_collections(client, previous)
+
+
+def migrate_collection(cfg: Config, client, drop_old: bool = False, batch_size: int = 1000) -> str:
+    # Rebuilds the index under the current schema from the documents already
+    # in Typesense, then swaps the alias. Searches keep hitting the old
+    # collection until the swap. Chunked collections only keep a summary, so
+    # migrating from one is refused in favour of a reindex from storage.
+    check_swap(cfg, client, drop_old)
+    source = resolve_alias(client, cfg.typesense_collection) or cfg.typesense_collection
+    if collection_is_chunked(client, source):
+        raise RuntimeError(
+            f"'{source}' is a chunked collection and only keeps a summary of each page; "
+            "rebuild from object storage with `python -m clawdgle.reindex` instead"
+        )
+    started = now_ts()
+    version = create_collections(cfg, client)
+    pages = map(_page_from_doc, iter_export(cfg, source))
+    copy_documents(cfg, client, version, pages, batch_size)
+
+    def copy_since(since: int, skip_newer: bool) -> int:
+        pages = map(_page_from_doc, iter_export(cfg, source, filter_by=f"fetched_at:>={since}"))
+        return copy_documents(cfg, client, version, pages, batch_size, skip_newer=skip_newer)
+
+    catch_up_and_swap(cfg, client, version, started, copy_since, drop_old=drop_old)
+    return version
 
 
 def now_ts() -> int:
     return int(time.time())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m clawdgle.index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    migrate = sub.add_parser("migrate", help="rebuild the collection under the current schema and swap the alias")
+    migrate.add_argument("--drop-old", action="store_true")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    cfg = load_config()
+    client = make_typesense_client(cfg)
+    if args.cmd == "migrate":
+        try:
+            version = migrate_collection(cfg, client, drop_old=args.drop_old, batch_size=args.batch_size)
+        except RuntimeError as e:
+            parser.exit(1, f"{e}\n")
+        print(f"{cfg.typesense_collection} -> {cfg.typesense_collection}_{version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from clawdgle.config import Config
+
+
+def _frame_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_stacks(seconds: float, hz: int) -> Counter:
+    # Samples every other thread's Python stack; output is in the collapsed
+    # ("folded") format read by flamegraph.pl, speedscope and inferno.
+    own = threading.get_ident()
+    interval = 1.0 / max(1, hz)
+    deadline = time.monotonic() + seconds
+    counts: Counter = Counter()
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            counts[_frame_stack(frame)] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def dump_profile(cfg: Config, name: str, seconds: float) -> str:
+    counts = sample_stacks(seconds, cfg.profile_hz)
+    os.makedirs(cfg.profile_dir, exist_ok=True)
+    path = os.path.join(cfg.profile_dir, f"{name}-{os.getpid()}-{int(time.time())}.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(collapsed(counts))
+    return path
+
+
+def install_profile_signal(cfg: Config, name: str) -> None:
+    # `kill -USR1 <pid>` samples the running process for PROFILE_SECONDS and
+    # writes a .folded file to PROFILE_DIR without stopping the process.
+    running = threading.Lock()
+
+    def _run() -> None:
+        try:
+            dump_profile(cfg, name, cfg.profile_seconds)
+        finally:
+            running.release()
+
+    def _handler(signum, frame) -> None:
+        if not running.acquire(blocking=False):
+            return
+        threading.Thread(target=_run, name="clawdgle-profiler", daemon=True).start()
+
+    signal.signal(signal.SIGUSR1, _handler)
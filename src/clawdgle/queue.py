@@ -1,9 +1,11 @@
 import json
-from typing import Optional
+import time
+from typing import Iterable, Optional
 
 import redis
 
 from clawdgle.config import Config
+from clawdgle.urls import canonicalize_url
 
 
 def make_redis(cfg: Config) -> redis.Redis:
@@ -11,10 +13,20 @@ def make_redis(cfg: Config) -> redis.Redis:
 
 
 def enqueue(r: redis.Redis, url: str, depth: int) -> None:
+    url = canonicalize_url(url)
+    if not url:
+        return
     payload = json.dumps({"url": url, "depth": depth})
     r.lpush("crawl:queue", payload)
 
 
+def enqueue_many(r: redis.Redis, items: Iterable[dict]) -> int:
+    payloads = [json.dumps(item) for item in items]
+    if payloads:
+        r.lpush("crawl:queue", *payloads)
+    return len(payloads)
+
+
 def enqueue_suggestion(r: redis.Redis, payload: dict) -> None:
     r.lpush("suggest:queue", json.dumps(payload))
 
@@ -46,7 +58,52 @@ def seen_key(url: str) -> str:
 
 
 def mark_seen(r: redis.Redis, url: str) -> bool:
-    return r.setnx(seen_key(url), 1)
+    # The value is when the url was claimed for crawling; keys written before
+    # that was recorded hold 1 and are never treated as stale.
+    return r.setnx(seen_key(url), int(time.time()))
+
+
+def _claimed_at(val) -> int:
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _is_stale(claimed_at: int, lastmod: Optional[int]) -> bool:
+    return bool(lastmod) and 1 < claimed_at < lastmod
+
+
+def claim_stale(r: redis.Redis, url: str, lastmod: Optional[int]) -> bool:
+    # Re-claims a seen url whose lastmod is newer than its last crawl. The
+    # GETSET makes sure only one worker wins when the url is queued twice.
+    if not _is_stale(_claimed_at(r.get(seen_key(url))), lastmod):
+        return False
+    return _is_stale(_claimed_at(r.getset(seen_key(url), int(time.time()))), lastmod)
+
+
+def filter_unseen(
+    r: redis.Redis, urls: list[str], batch_key: str, lastmods: Optional[dict[str, int]] = None
+) -> list[str]:
+    # Drops urls already crawled and urls repeated within one bulk upload;
+    # batch_key is a short-lived Redis set scoped to that upload. Seen urls
+    # are kept when their lastmod is newer than their last crawl.
+    if not urls:
+        return []
+    lastmods = lastmods or {}
+    pipe = r.pipeline(transaction=False)
+    for url in urls:
+        pipe.get(seen_key(url))
+    for url in urls:
+        pipe.sadd(batch_key, url)
+    pipe.expire(batch_key, 3600)
+    results = pipe.execute()
+    seen, added = results[: len(urls)], results[len(urls): 2 * len(urls)]
+    return [
+        url
+        for url, s, a in zip(urls, seen, added)
+        if a and (s is None or _is_stale(_claimed_at(s), lastmods.get(url)))
+    ]
 
 
 def incr_stat(r: redis.Redis, name: str, inc: int = 1) -> None:
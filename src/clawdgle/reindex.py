@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import httpx
+
+from clawdgle.config import Config, load_config
+from clawdgle.index import (
+    build_documents,
+    catch_up_and_swap,
+    check_swap,
+    chunks_alias,
+    copy_documents,
+    create_collections,
+    get_document,
+    import_documents,
+    iter_export,
+    make_typesense_client,
+    now_ts,
+    resolve_alias,
+    version_targets,
+)
+from clawdgle.storage import get_markdown_object, make_s3_client
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def iter_object_pages(cfg: Config, s3, prefix: str, start_after: str) -> Iterator[list[dict]]:
+    paginator = s3.get_paginator("list_objects_v2")
+    kwargs = {"Bucket": cfg.s3_bucket, "Prefix": prefix, "PaginationConfig": {"PageSize": 1000}}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    for page in paginator.paginate(**kwargs):
+        objects = [o for o in page.get("Contents", []) if o["Key"].endswith(".md")]
+        if objects:
+            yield objects
+
+
+def load_page(cfg: Config, s3, ts, obj: dict) -> Optional[dict]:
+    # Returns None for objects that cannot be indexed (no recoverable url);
+    # storage errors propagate so the caller can retry the key later.
+    key = obj["Key"]
+    stored = get_markdown_object(cfg, s3, key)
+    url, title = stored["url"], stored["title"]
+    if not url:
+        # Objects written before metadata was added: the key is the doc id,
+        # so recover url and title from the live index if it still exists.
+        digest = os.path.basename(key)[: -len(".md")]
+        existing = get_document(cfg, ts, digest)
+        if not existing:
+            return None
+        url, title = existing.get("url"), existing.get("title")
+    fetched_at = stored["fetched_at"]
+    if not fetched_at:
+        fetched_at = int(obj["LastModified"].timestamp()) if obj.get("LastModified") else now_ts()
+    return {
+        "url": url,
+        "title": title,
+        "markdown": stored["markdown"],
+        "s3_key": key,
+        "fetched_at": fetched_at,
+    }
+
+
+def _try_load(cfg: Config, s3, ts, obj: dict) -> Tuple[Optional[dict], bool]:
+    try:
+        return load_page(cfg, s3, ts, obj), False
+    except Exception:
+        return None, True
+
+
+def _import_batch(ts, targets: dict, docs: list[dict], chunks: list[dict], batch_size: int) -> None:
+    for collection, items in ((targets["docs"], docs), (targets.get("chunks"), chunks)):
+        if not collection:
+            continue
+        for start in range(0, len(items), batch_size):
+            import_documents(ts, collection, items[start:start + batch_size])
+
+
+def _batches(cfg: Config, s3, prefix: str, state: dict) -> Iterator[Tuple[list[dict], str, list[str]]]:
+    # Keys that failed on a previous run are retried first. Yields
+    # (objects, listing cursor after this batch, retry keys still pending).
+    retry = state["failed_keys"]
+    for start in range(0, len(retry), 1000):
+        yield [{"Key": k} for k in retry[start:start + 1000]], state["start_after"], retry[start + 1000:]
+    for objects in iter_object_pages(cfg, s3, prefix, state["start_after"]):
+        yield objects, objects[-1]["Key"], []
+
+
+def reindex(
+    cfg: Config,
+    checkpoint_path: str,
+    prefix: str,
+    concurrency: int = 64,
+    batch_size: int = 1000,
+    swap: bool = True,
+    drop_old: bool = False,
+    force: bool = False,
+) -> dict:
+    s3 = make_s3_client(cfg, max_pool_connections=concurrency, max_attempts=10)
+    ts = make_typesense_client(cfg, connection_timeout=120)
+    if swap:
+        check_swap(cfg, ts, drop_old)
+
+    state = load_checkpoint(checkpoint_path)
+    if state is None:
+        state = {
+            "version": create_collections(cfg, ts),
+            "started_at": now_ts(),
+            "start_after": "",
+            "indexed": 0,
+            "skipped": 0,
+            "failed_keys": [],
+        }
+        save_checkpoint(checkpoint_path, state)
+    version_names = dict(version_targets(cfg, state["version"]))
+    targets = {
+        "docs": version_names[cfg.typesense_collection],
+        "chunks": version_names.get(chunks_alias(cfg)),
+    }
+
+    started = time.monotonic()
+    done_at_start = state["indexed"] + state["skipped"]
+    failed: list[str] = []
+    pending: Optional[Future] = None
+    pending_state: dict = {}
+
+    def load_all(objects: list[dict]) -> list[Tuple[dict, Optional[dict], bool]]:
+        return [(o, *r) for o, r in zip(objects, pool.map(lambda o: _try_load(cfg, s3, ts, o), objects))]
+
+    # Fetches for the next listing page overlap with the import of the last.
+    with ThreadPoolExecutor(concurrency) as pool, ThreadPoolExecutor(1) as importer:
+        for objects, start_after, retry_left in _batches(cfg, s3, prefix, state):
+            docs: list[dict] = []
+            chunks: list[dict] = []
+            skipped = 0
+            for obj, page, error in load_all(objects):
+                if error:
+                    failed.append(obj["Key"])
+                elif page is None:
+                    skipped += 1
+                else:
+                    doc, doc_chunks = build_documents(cfg, page)
+                    docs.append(doc)
+                    chunks.extend(doc_chunks)
+
+            if pending is not None:
+                pending.result()
+                state = pending_state
+                save_checkpoint(checkpoint_path, state)
+                rate = (state["indexed"] + state["skipped"] - done_at_start) / max(
+                    time.monotonic() - started, 1e-6
+                )
+                print(
+                    f"indexed={state['indexed']} skipped={state['skipped']} "
+                    f"failed={len(state['failed_keys'])} rate={rate:.0f}/s",
+                    flush=True,
+                )
+
+            pending = importer.submit(_import_batch, ts, targets, docs, chunks, batch_size)
+            pending_state = {
+                **state,
+                "start_after": start_after,
+                "indexed": state["indexed"] + len(docs),
+                "skipped": state["skipped"] + skipped,
+                "failed_keys": failed + retry_left,
+            }
+
+        if pending is not None:
+            pending.result()
+            state = pending_state
+            save_checkpoint(checkpoint_path, state)
+
+        if not swap:
+            return state
+        if state["failed_keys"] and not force:
+            raise RuntimeError(
+                f"{len(state['failed_keys'])} objects failed to load; rerun to retry them "
+                "(or pass --force to swap without them)"
+            )
+        if state["indexed"] == 0 and not force:
+            raise RuntimeError("no documents were indexed; check --prefix and storage settings (or pass --force)")
+
+        source = resolve_alias(ts, cfg.typesense_collection) or cfg.typesense_collection
+
+        def copy_since(since: int, skip_newer: bool) -> int:
+            # Pages the crawler stored while the rebuild ran, reloaded from storage.
+            try:
+                keys = [
+                    d["s3_key"]
+                    for d in iter_export(cfg, source, filter_by=f"fetched_at:>={since}")
+                    if d.get("s3_key")
+                ]
+            except httpx.HTTPStatusError:
+                return 0
+            copied = 0
+            for start in range(0, len(keys), 1000):
+                loaded = load_all([{"Key": k} for k in keys[start:start + 1000]])
+                if any(error for _, _, error in loaded):
+                    raise RuntimeError("failed to load pages during catch-up; rerun to retry")
+                pages = [page for _, page, _ in loaded if page is not None]
+                copied += copy_documents(cfg, ts, state["version"], pages, batch_size, skip_newer=skip_newer)
+            return copied
+
+        catch_up_and_swap(cfg, ts, state["version"], state["started_at"], copy_since, drop_old=drop_old)
+
+    os.remove(checkpoint_path)
+    return state
+
+
+def main() -> None:
+    cfg = load_config()
+    parser = argparse.ArgumentParser(
+        prog="python -m clawdgle.reindex",
+        description="Rebuild the search index from markdown in object storage.",
+    )
+    parser.add_argument("--checkpoint", default="reindex-checkpoint.json")
+    parser.add_argument("--prefix", default=cfg.s3_prefix)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-swap", action="store_true", help="build the new collection but leave the alias")
+    parser.add_argument("--drop-old", action="store_true", help="delete the previous collection after the swap")
+    parser.add_argument(
+        "--force", action="store_true", help="swap even if nothing was indexed or some objects failed to load"
+    )
+    args = parser.parse_args()
+
+    try:
+        state = reindex(
+            cfg,
+            checkpoint_path=args.checkpoint,
+            prefix=args.prefix,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            swap=not args.no_swap,
+            drop_old=args.drop_old,
+            force=args.force,
+        )
+    except RuntimeError as e:
+        parser.exit(1, f"{e}\n")
+    print(f"{cfg.typesense_collection}_{state['version']}: indexed={state['indexed']} skipped={state['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
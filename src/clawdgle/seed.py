@@ -0,0 +1,126 @@
+import json
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import redis
+
+from clawdgle.queue import enqueue_many, filter_unseen
+from clawdgle.urls import canonicalize_url
+
+_MAX_LINE_BYTES = 64 * 1024
+_MAX_GUNZIP_CHUNK = 1024 * 1024
+
+
+def new_batch_key() -> str:
+    return f"seed:batch:{uuid.uuid4().hex}"
+
+
+def _new_gunzip():
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+async def aiter_gunzipped(
+    chunks: AsyncIterator[bytes], gzipped: Optional[bool] = None
+) -> AsyncIterator[bytes]:
+    # Unless gzipped is given (e.g. from Content-Encoding), the gzip magic is
+    # sniffed from the first two bytes, however the body happens to be split.
+    # Concatenated gzip members (`cat a.gz b.gz`) are all decoded, and output
+    # is produced in pieces of at most _MAX_GUNZIP_CHUNK bytes however well
+    # the input compresses.
+    decomp = _new_gunzip() if gzipped else None
+    head = b""
+    async for chunk in chunks:
+        if gzipped is None:
+            head += chunk
+            if len(head) < 2:
+                continue
+            gzipped = head[:2] == b"\x1f\x8b"
+            chunk, head = head, b""
+            if gzipped:
+                decomp = _new_gunzip()
+        if not chunk:
+            continue
+        if decomp is None:
+            yield chunk
+            continue
+        data = chunk
+        while data:
+            out = decomp.decompress(data, _MAX_GUNZIP_CHUNK)
+            if out:
+                yield out
+            if decomp.eof:
+                # Trailing zero padding after the last member is allowed.
+                data = decomp.unused_data.lstrip(b"\x00")
+                decomp = _new_gunzip()
+            else:
+                data = decomp.unconsumed_tail
+    if head:
+        yield head
+    if decomp:
+        tail = decomp.flush()
+        if tail:
+            yield tail
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes], gzipped: Optional[bool] = None) -> AsyncIterator[str]:
+    buf = b""
+    async for data in aiter_gunzipped(chunks, gzipped):
+        buf += data
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="ignore").strip()
+        if len(buf) > _MAX_LINE_BYTES:
+            buf = b""
+    if buf:
+        yield buf.decode("utf-8", errors="ignore").strip()
+
+
+def lastmod_ts(value) -> Optional[int]:
+    # W3C datetime as used in sitemaps; a bare date or missing zone is UTC.
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def parse_seed_line(line: str, default_depth: int) -> Optional[dict]:
+    # Accepts a bare URL, a JSON string, or {"url": ..., "depth": ..., "lastmod": ...}.
+    if not line:
+        return None
+    if line[0] in "{\"":
+        try:
+            val = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(val, str):
+            val = {"url": val}
+        if not isinstance(val, dict) or not isinstance(val.get("url"), str):
+            return None
+    else:
+        val = {"url": line}
+
+    url = canonicalize_url(val["url"])
+    if not url:
+        return None
+    item = {"url": url, "depth": default_depth}
+    try:
+        item["depth"] = int(val.get("depth", default_depth))
+    except (TypeError, ValueError):
+        pass
+    if val.get("lastmod"):
+        item["lastmod"] = str(val["lastmod"])
+    return item
+
+
+def seed_batch(r: redis.Redis, items: list[dict], batch_key: str) -> int:
+    by_url = {item["url"]: item for item in items}
+    lastmods = {url: ts for url, item in by_url.items() if (ts := lastmod_ts(item.get("lastmod")))}
+    fresh = filter_unseen(r, list(by_url), batch_key, lastmods)
+    return enqueue_many(r, (by_url[url] for url in fresh))
@@ -0,0 +1,74 @@
+import xml.etree.ElementTree as ET
+import zlib
+from typing import AsyncIterator, Optional, Tuple
+
+import httpx
+
+from clawdgle.seed import aiter_gunzipped
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(elem: ET.Element, name: str) -> Optional[str]:
+    for child in elem:
+        if _local(child.tag) == name and child.text:
+            return child.text.strip()
+    return None
+
+
+async def _parse_sitemap(
+    client: httpx.AsyncClient, url: str, max_bytes: int, stats: dict
+) -> AsyncIterator[Tuple[str, str, Optional[str]]]:
+    # Yields ("url", loc, lastmod) for urlsets and ("sitemap", loc, lastmod)
+    # for sitemap indexes. Parsed elements are dropped from the tree as they
+    # complete, so memory stays flat however large the sitemap is.
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    received = 0
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        async for data in aiter_gunzipped(resp.aiter_bytes()):
+            received += len(data)
+            if received > max_bytes:
+                stats["sitemap_truncated"] = stats.get("sitemap_truncated", 0) + 1
+                break
+            parser.feed(data)
+            for event, elem in parser.read_events():
+                if event == "start":
+                    if root is None:
+                        root = elem
+                    continue
+                kind = _local(elem.tag)
+                if kind in {"url", "sitemap"}:
+                    loc = _child_text(elem, "loc")
+                    if loc:
+                        yield kind, loc, _child_text(elem, "lastmod")
+            if root is not None:
+                del root[:]
+
+
+async def iter_sitemap_urls(
+    client: httpx.AsyncClient,
+    url: str,
+    stats: dict,
+    max_sitemaps: int = 1000,
+    max_bytes: int = 100_000_000,
+) -> AsyncIterator[Tuple[str, Optional[str]]]:
+    pending = [url]
+    visited = set()
+    while pending and len(visited) < max_sitemaps:
+        sitemap_url = pending.pop()
+        if sitemap_url in visited:
+            continue
+        visited.add(sitemap_url)
+        stats["sitemaps"] = stats.get("sitemaps", 0) + 1
+        try:
+            async for kind, loc, lastmod in _parse_sitemap(client, sitemap_url, max_bytes, stats):
+                if kind == "sitemap":
+                    pending.append(loc)
+                else:
+                    yield loc, lastmod
+        except (httpx.HTTPError, httpx.InvalidURL, ET.ParseError, zlib.error):
+            stats["sitemap_errors"] = stats.get("sitemap_errors", 0) + 1
@@ -1,18 +1,26 @@
 import hashlib
-from typing import Tuple
+from urllib.parse import quote, unquote
 
 import boto3
+from botocore.config import Config as BotoConfig
 
 from clawdgle.config import Config
 
+# S3 caps user metadata at 2KB per object.
+_MAX_META_CHARS = 1800
 
-def make_s3_client(cfg: Config):
+
+def make_s3_client(cfg: Config, max_pool_connections: int = 10, max_attempts: int = 3):
     return boto3.client(
         "s3",
         endpoint_url=cfg.s3_endpoint_url,
         region_name=cfg.s3_region,
         aws_access_key_id=cfg.s3_access_key,
         aws_secret_access_key=cfg.s3_secret_key,
+        config=BotoConfig(
+            max_pool_connections=max_pool_connections,
+            retries={"mode": "standard", "max_attempts": max_attempts},
+        ),
     )
 
 
@@ -21,13 +29,34 @@ def s3_key_for_url(cfg: Config, url: str) -> str:
     return f"{cfg.s3_prefix}{digest}.md"
 
 
-def put_markdown(cfg: Config, s3_client, url: str, markdown: str) -> str:
+def _object_metadata(url: str, title: str, fetched_at: int) -> dict:
+    # Metadata values must be ASCII. Everything is percent-encoded (including
+    # existing %XX escapes) so unquote() returns the exact original.
+    meta = {"fetched-at": str(fetched_at)}
+    quoted_url = quote(url, safe="")
+    if len(quoted_url) > _MAX_META_CHARS:
+        return meta
+    meta["url"] = quoted_url
+    budget = _MAX_META_CHARS - len(quoted_url)
+    title = (title or "")[:budget]
+    quoted_title = quote(title, safe="")
+    while len(quoted_title) > budget:
+        title = title[: len(title) * budget // len(quoted_title)]
+        quoted_title = quote(title, safe="")
+    meta["title"] = quoted_title
+    return meta
+
+
+def put_markdown(
+    cfg: Config, s3_client, url: str, markdown: str, title: str = "", fetched_at: int = 0
+) -> str:
     key = s3_key_for_url(cfg, url)
     s3_client.put_object(
         Bucket=cfg.s3_bucket,
         Key=key,
         Body=markdown.encode("utf-8"),
         ContentType="text/markdown; charset=utf-8",
+        Metadata=_object_metadata(url, title, fetched_at),
     )
     return key
 
@@ -36,3 +65,18 @@ def get_markdown(cfg: Config, s3_client, key: str) -> str:
     resp = s3_client.get_object(Bucket=cfg.s3_bucket, Key=key)
     data = resp["Body"].read()
     return data.decode("utf-8")
+
+
+def get_markdown_object(cfg: Config, s3_client, key: str) -> dict:
+    resp = s3_client.get_object(Bucket=cfg.s3_bucket, Key=key)
+    meta = resp.get("Metadata") or {}
+    try:
+        fetched_at = int(meta.get("fetched-at") or 0)
+    except ValueError:
+        fetched_at = 0
+    return {
+        "markdown": resp["Body"].read().decode("utf-8"),
+        "url": unquote(meta.get("url", "")),
+        "title": unquote(meta.get("title", "")),
+        "fetched_at": fetched_at,
+    }
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from clawdgle.config import Config
+
+_tracer = None
+
+
+def init_tracing(cfg: Config, service_name: str) -> bool:
+    global _tracer
+    if not cfg.trace_enabled:
+        return False
+
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if cfg.trace_exporter == "file":
+        out = open(cfg.trace_file_path, "a", encoding="utf-8")
+        exporter = ConsoleSpanExporter(
+            out=out,
+            formatter=lambda s: s.to_json(indent=None) + "\n",
+        )
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        exporter = OTLPSpanExporter(endpoint=cfg.trace_otlp_endpoint or None)
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("clawdgle")
+    return True
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[object]]:
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name) as s:
+        for key, val in attrs.items():
+            if val is not None:
+                s.set_attribute(key, val)
+        yield s
+
+
+def aiohttp_trace_config():
+    # DNS and connection setup (TCP + TLS) happen inside session.get, so they
+    # are only visible through aiohttp's client tracing hooks.
+    import aiohttp
+
+    tc = aiohttp.TraceConfig()
+    if _tracer is None:
+        return tc
+
+    def _start(name: str):
+        async def handler(session, ctx, params):
+            ctx.spans = getattr(ctx, "spans", {})
+            ctx.spans[name] = _tracer.start_span(name)
+
+        return handler
+
+    def _end(name: str):
+        async def handler(session, ctx, params):
+            s = getattr(ctx, "spans", {}).pop(name, None)
+            if s is not None:
+                s.end()
+
+        return handler
+
+    async def _abort(session, ctx, params):
+        for s in getattr(ctx, "spans", {}).values():
+            s.end()
+        ctx.spans = {}
+
+    tc.on_dns_resolvehost_start.append(_start("fetch.dns"))
+    tc.on_dns_resolvehost_end.append(_end("fetch.dns"))
+    tc.on_connection_create_start.append(_start("fetch.connect"))
+    tc.on_connection_create_end.append(_end("fetch.connect"))
+    tc.on_request_exception.append(_abort)
+    return tc
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from clawdgle.dedupe import band_keys, hamming, simhash
+
+_TEXT = " ".join(f"word{i % 97} token{i % 13}" for i in range(400))
+
+
+def test_simhash_skips_short_text():
+    assert simhash("too short to fingerprint") is None
+
+
+def test_simhash_is_stable_and_64_bit():
+    fp = simhash(_TEXT)
+    assert fp == simhash(_TEXT.upper())
+    assert 0 <= fp < 1 << 64
+
+
+def test_simhash_small_edit_is_near():
+    edited = _TEXT.replace("word5 ", "changed ", 1)
+    assert hamming(simhash(_TEXT), simhash(edited)) <= 3
+
+
+def test_hamming():
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(1 << 63, 0) == 1
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 7, 15])
+def test_band_keys_cover_all_bits(max_distance):
+    n = max_distance + 1
+    keys = band_keys((1 << 64) - 1, max_distance)
+    assert len(keys) == n
+    assert all(k.startswith(f"dedupe:band:{n}:") for k in keys)
+    assert sum(int(k.rsplit(":", 1)[1], 16).bit_length() for k in keys) == 64
+
+
+@pytest.mark.parametrize("max_distance", [1, 3, 6])
+def test_band_keys_share_a_band_within_distance(max_distance):
+    rng = random.Random(max_distance)
+    for _ in range(200):
+        fp = rng.getrandbits(64)
+        other = fp
+        for bit in rng.sample(range(64), max_distance):
+            other ^= 1 << bit
+        assert set(band_keys(fp, max_distance)) & set(band_keys(other, max_distance))
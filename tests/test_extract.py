@@ -0,0 +1,21 @@
+from clawdgle.extract import chunk_markdown
+
+
+def test_chunks_respect_size():
+    paragraphs = ["p" * n for n in (10, 700, 900, 3200, 5, 1499, 1500)]
+    chunks = chunk_markdown("\n\n".join(paragraphs), 1500, 50)
+    assert all(len(c) <= 1500 for c in chunks)
+    assert "".join(c.replace("\n\n", "") for c in chunks) == "".join(paragraphs)
+
+
+def test_small_paragraphs_are_packed():
+    assert chunk_markdown("a\n\nb\n\n\n\nc", 100, 50) == ["a\n\nb\n\nc"]
+
+
+def test_max_chunks():
+    chunks = chunk_markdown("x" * 10_000, 100, 3)
+    assert chunks == ["x" * 100] * 3
+
+
+def test_empty():
+    assert chunk_markdown("", 100, 10) == []
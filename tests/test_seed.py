@@ -0,0 +1,102 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+from clawdgle.seed import aiter_gunzipped, aiter_lines, lastmod_ts, parse_seed_line
+
+
+async def _chunks(data: bytes, sizes):
+    pos = 0
+    for size in sizes:
+        yield data[pos:pos + size]
+        pos += size
+    if pos < len(data):
+        yield data[pos:]
+
+
+def _collect(agen) -> list:
+    async def run():
+        return [item async for item in agen]
+
+    return asyncio.run(run())
+
+
+def test_gunzip_plain_passthrough():
+    assert b"".join(_collect(aiter_gunzipped(_chunks(b"a\nb\n", [1, 1, 2])))) == b"a\nb\n"
+
+
+def test_gunzip_short_first_chunk():
+    body = gzip.compress(b"https://example.com/\n")
+    assert b"".join(_collect(aiter_gunzipped(_chunks(body, [1, 0, 1, 3])))) == b"https://example.com/\n"
+
+
+def test_gunzip_single_byte_body():
+    assert _collect(aiter_gunzipped(_chunks(b"x", [1]))) == [b"x"]
+
+
+def test_gunzip_multi_member():
+    body = gzip.compress(b"a\n") + gzip.compress(b"b\n") + b"\x00\x00"
+    assert b"".join(_collect(aiter_gunzipped(_chunks(body, [5])))) == b"a\nb\n"
+
+
+def test_gunzip_caps_output_pieces():
+    body = gzip.compress(b"x" * (5 * 1024 * 1024))
+    pieces = _collect(aiter_gunzipped(_chunks(body, [len(body)])))
+    assert sum(map(len, pieces)) == 5 * 1024 * 1024
+    assert max(map(len, pieces)) <= 1024 * 1024
+
+
+def test_gunzip_forced_rejects_plain_body():
+    with pytest.raises(zlib.error):
+        _collect(aiter_gunzipped(_chunks(b"not gzip", [8]), gzipped=True))
+
+
+def test_lines_across_chunks_and_members():
+    body = gzip.compress(b"a\n b") + gzip.compress(b"c\r\n\nd")
+    assert _collect(aiter_lines(_chunks(body, [1, 2]))) == ["a", "bc", "", "d"]
+
+
+def test_lines_drops_oversized_line():
+    body = b"x" * (70 * 1024) + b"\nok\n"
+    lines = _collect(aiter_lines(_chunks(body, [1024] * 80)))
+    assert lines[-1] == "ok"
+    assert all(len(line) <= 64 * 1024 for line in lines)
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("https://Example.com", {"url": "https://example.com/", "depth": 1}),
+        ('"https://example.com/a"', {"url": "https://example.com/a", "depth": 1}),
+        ('{"url": "https://example.com/", "depth": 3}', {"url": "https://example.com/", "depth": 3}),
+        ('{"url": "https://example.com/", "depth": "x"}', {"url": "https://example.com/", "depth": 1}),
+        (
+            '{"url": "https://example.com/", "lastmod": "2024-05-01"}',
+            {"url": "https://example.com/", "depth": 1, "lastmod": "2024-05-01"},
+        ),
+    ],
+)
+def test_parse_seed_line(line, expected):
+    assert parse_seed_line(line, 1) == expected
+
+
+@pytest.mark.parametrize("line", ["", "{not json", '{"depth": 1}', '{"url": 5}', "[1]", "ftp://example.com/"])
+def test_parse_seed_line_rejects(line):
+    assert parse_seed_line(line, 1) is None
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-05-01", 1714521600),
+        ("2024-05-01T00:00:00Z", 1714521600),
+        ("2024-05-01T02:00:00+02:00", 1714521600),
+        ("", None),
+        (None, None),
+        ("yesterday", None),
+    ],
+)
+def test_lastmod_ts(value, expected):
+    assert lastmod_ts(value) == expected
@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from clawdgle.config import load_config
+from clawdgle.storage import _MAX_META_CHARS, _object_metadata, get_markdown_object, put_markdown
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType, Metadata):
+        assert all(v.isascii() for v in Metadata.values())
+        self.objects[(Bucket, Key)] = (Body, dict(Metadata))
+
+    def get_object(self, Bucket, Key):
+        body, meta = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(body), "Metadata": meta}
+
+
+@pytest.mark.parametrize(
+    "url, title",
+    [
+        ("https://example.com/a%2Fb?q=%20x", "100% sure"),
+        ("https://example.com/caf%C3%A9", "Café — naïve"),
+        ("https://example.com/literal%25", "%41 not an A"),
+    ],
+)
+def test_metadata_round_trip(url, title):
+    cfg = load_config()
+    s3 = FakeS3()
+    key = put_markdown(cfg, s3, url, "# body", title=title, fetched_at=123)
+    stored = get_markdown_object(cfg, s3, key)
+    assert stored == {"markdown": "# body", "url": url, "title": title, "fetched_at": 123}
+
+
+def test_long_title_is_truncated_to_budget():
+    meta = _object_metadata("https://example.com/", "é" * 5000, 1)
+    assert len(meta["url"]) + len(meta["title"]) <= _MAX_META_CHARS
+    assert meta["title"]
+
+
+def test_url_over_budget_drops_metadata():
+    meta = _object_metadata("https://example.com/" + "a" * _MAX_META_CHARS, "t", 1)
+    assert meta == {"fetched-at": "1"}
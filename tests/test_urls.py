@@ -0,0 +1,34 @@
+import pytest
+
+from clawdgle.urls import canonicalize_url
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("HTTP://Example.COM", "http://example.com/"),
+        ("https://example.com:443/a?b=1#frag", "https://example.com/a?b=1"),
+        ("http://example.com:80/", "http://example.com/"),
+        ("http://example.com:8080/x", "http://example.com:8080/x"),
+        ("https://example.com:80/", "https://example.com:80/"),
+        ("http://[2001:DB8::1]/", "http://[2001:db8::1]/"),
+        ("http://[2001:db8::1]:80/a", "http://[2001:db8::1]/a"),
+        ("https://[::1]:8443", "https://[::1]:8443/"),
+        ("  https://example.com/a%2Fb  ", "https://example.com/a%2Fb"),
+    ],
+)
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+@pytest.mark.parametrize(
+    "url",
+    ["", "example.com", "ftp://example.com/", "mailto:a@example.com", "http://example.com:99999/", "http:///path"],
+)
+def test_canonicalize_url_rejects(url):
+    assert canonicalize_url(url) is None
+
+
+def test_canonicalize_url_is_idempotent():
+    url = canonicalize_url("HTTPS://[::1]:443/a?b#c")
+    assert canonicalize_url(url) == url